@@ -92,6 +92,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(),  db: AsyncSess
             detail="Incorrect username or password",
             headers = {"WWW-Authenticate": "Bearer"}
         )
+    await User.defer_update(user.id, updated_at=datetime.now())
     access_token_expires = timedelta(minutes = settings.JWT_EXP)
     access_token = create_access_token(
         data = {"sub": user.displayname}, expires_delta=access_token_expires
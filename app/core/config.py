@@ -37,6 +37,13 @@ class Config(BaseSettings):
     CORS_ORIGINS_REGEX: str | None = None
     CORS_HEADERS: list[str]
 
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 1.0
+    WRITE_BEHIND_MAX_PENDING: int = 10000
+    WRITE_BEHIND_USE_REDIS: bool = False
+
     JWT_ALG: str | None = "HS256"
     JWT_EXP: int | None = 30
     JWT_SECRET: str | None = "mysecret"
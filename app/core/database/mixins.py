@@ -3,6 +3,7 @@ from datetime import datetime
 from sqlalchemy import select, delete, update, func
 from sqlalchemy.orm import Mapped, mapped_column, selectinload, exc
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database.write_behind import write_behind
 
 logger = logging.getLogger(__name__)
 
@@ -114,6 +115,11 @@ class WithAsyncCrud(object):
         else:
             await db.flush()
         
+    @classmethod
+    async def defer_update(cls, id, **kwargs):
+        """ Queue a non-critical update to be flushed in a later batch """
+        await write_behind.update(cls, id, **kwargs)
+
     @classmethod
     async def delete(cls, db: AsyncSession, id) -> bool:
         result = await db.execute(delete(cls).where(cls.id == id))
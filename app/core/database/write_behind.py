@@ -0,0 +1,316 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database.base import DeclarativeBase
+from app.core.database.session import AsyncSessionLocal
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # pragma: no cover
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+UPDATE = "update"
+INSERT = "insert"
+
+
+class MemoryBackend:
+    """ In-process queue. Updates to the same row are merged as they arrive. """
+
+    def __init__(self):
+        self.updates: dict[tuple, dict] = {}
+        self.inserts: list[tuple] = []
+
+    def prepare(self, op: tuple) -> tuple:
+        return op
+
+    async def push(self, op: tuple, limit: int) -> int | None:
+        """ Queue `op` and return the new queue size, or None if the queue is full """
+        kind, model, pk, values = op
+        if kind == UPDATE and (model, pk) in self.updates:
+            self.updates[(model, pk)].update(values)
+        elif await self.size() >= limit:
+            return None
+        elif kind == UPDATE:
+            self.updates[(model, pk)] = dict(values)
+        else:
+            self.inserts.append(op)
+        return await self.size()
+
+    async def pop_batch(self, size: int) -> list[tuple]:
+        batch = self.inserts[:size]
+        del self.inserts[:size]
+        while self.updates and len(batch) < size:
+            key = next(iter(self.updates))
+            model, pk = key
+            batch.append((UPDATE, model, pk, self.updates.pop(key)))
+        return batch
+
+    async def size(self) -> int:
+        return len(self.inserts) + len(self.updates)
+
+    async def close(self) -> None:
+        pass
+
+
+def _encode_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, UUID):
+        return {"$uuid": str(value)}
+    raise TypeError(f"Cannot queue value of type {type(value).__name__} through Redis, pass a str/int/float/bool/None, date, time, datetime, Decimal or UUID")
+
+
+_DECODERS = {
+    "$datetime": datetime.fromisoformat,
+    "$date": date.fromisoformat,
+    "$time": time.fromisoformat,
+    "$decimal": Decimal,
+    "$uuid": UUID,
+}
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and len(value) == 1:
+        tag, encoded = next(iter(value.items()))
+        return _DECODERS[tag](encoded)
+    return value
+
+
+def model_registry() -> dict[str, type]:
+    """ Mapped models by table name, used to resolve models of queued jobs """
+    return {mapper.class_.__tablename__: mapper.class_ for mapper in DeclarativeBase.registry.mappers}
+
+
+def serialize_op(op: tuple) -> str:
+    kind, model, pk, values = op
+    return json.dumps({
+        "kind": kind,
+        "table": model.__tablename__,
+        "pk": _encode_value(pk),
+        "values": {k: _encode_value(v) for k, v in values.items()},
+    })
+
+
+def deserialize_op(data: str | bytes, registry: dict[str, type]) -> tuple:
+    job = json.loads(data)
+    values = {k: _decode_value(v) for k, v in job["values"].items()}
+    return job["kind"], registry[job["table"]], _decode_value(job["pk"]), values
+
+
+class RedisBackend:
+    """
+    Redis list shared between workers. Updates are merged when a batch is popped.
+    Jobs are stored as JSON; popping batches needs Redis >= 6.2.
+    """
+
+    def __init__(self, url: str, key: str):
+        if aioredis is None:
+            raise RuntimeError("The redis package is required for the Redis write-behind backend")
+        self.redis = aioredis.from_url(url)
+        self.key = key
+        self.registry = model_registry()
+
+    def prepare(self, op: tuple) -> str:
+        return serialize_op(op)
+
+    async def push(self, payload: str, limit: int) -> int | None:
+        """ Queue `payload` and return the new queue size, or None if the queue is full """
+        # One round trip: push, then trim anything past the limit (including this job when full)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(self.key, payload)
+            pipe.ltrim(self.key, 0, limit - 1)
+            length, _ = await pipe.execute()
+        return length if length <= limit else None
+
+    async def pop_batch(self, size: int) -> list[tuple]:
+        items = await self.redis.lpop(self.key, size) or []
+        ops = []
+        for item in items:
+            try:
+                ops.append(deserialize_op(item, self.registry))
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Dropping malformed write-behind job : {item!r}")
+        return ops
+
+    async def size(self) -> int:
+        return await self.redis.llen(self.key)
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def coalesce(ops: list[tuple]) -> tuple[list[tuple], dict[tuple, dict]]:
+    inserts, updates = [], {}
+    for kind, model, pk, values in ops:
+        if kind == UPDATE:
+            updates.setdefault((model, pk), {}).update(values)
+        else:
+            inserts.append((model, values))
+    return inserts, updates
+
+
+class WriteBehindQueue:
+    """
+    Deferred, batched writes for non-critical side effects (last-seen
+    timestamps, audit rows...). Writes are flushed in multi-row statements
+    once `batch_size` operations are pending or every `flush_interval`
+    seconds, whichever comes first. When a batch fails, its operations are
+    retried one by one and only the failing ones are logged and dropped.
+    New writes are dropped once `max_pending` operations are waiting or
+    while the queue is not started.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, batch_size: int = 500, flush_interval: float = 1.0, max_pending: int = 10000, redis_url: str | None = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.redis_url = redis_url
+        self.backend = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._running = False
+        self._flush_lock = asyncio.Lock()
+
+    async def start(self):
+        if self.redis_url:
+            self.backend = RedisBackend(self.redis_url, key=f"{settings.APP_NAME}:write_behind")
+        else:
+            self.backend = MemoryBackend()
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("Write-behind queue started")
+
+    async def stop(self):
+        if self.backend is None:
+            return
+        # Let the flush loop finish its current batch rather than cancelling it mid-transaction
+        self._running = False
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as exc:
+                logger.exception(f"Write-behind flush loop failed : {str(exc)}")
+            self._task = None
+        try:
+            await self.drain()
+        finally:
+            await self.backend.close()
+            self.backend = None
+        logger.info("Write-behind queue stopped")
+
+    async def update(self, model, pk, **values):
+        await self._push((UPDATE, model, pk, values))
+
+    async def insert(self, model, **values):
+        await self._push((INSERT, model, None, values))
+
+    async def _push(self, op: tuple):
+        if self.backend is None:
+            logger.warning(f"Write-behind queue is not started, dropping {op[0]} on {op[1].__tablename__}")
+            return
+        # Unsupported values are a caller bug, so they raise instead of being dropped
+        payload = self.backend.prepare(op)
+        try:
+            size = await self.backend.push(payload, self.max_pending)
+        except Exception as exc:
+            logger.exception(f"Unable to queue write-behind {op[0]} on {op[1].__tablename__} : {str(exc)}")
+            return
+        if size is None:
+            logger.warning(f"Write-behind queue is full ({self.max_pending} pending), dropping {op[0]} on {op[1].__tablename__}")
+        elif size >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except Exception as exc:
+                logger.exception(f"Write-behind drain failed : {str(exc)}")
+
+    async def drain(self):
+        """ Flush batches until the queue is empty """
+        async with self._flush_lock:
+            while True:
+                try:
+                    ops = await self.backend.pop_batch(self.batch_size)
+                except Exception as exc:
+                    logger.exception(f"Unable to read write-behind batch : {str(exc)}")
+                    return
+                if not ops:
+                    return
+                try:
+                    async with self.session_factory() as db:
+                        await self._flush(db, ops)
+                except Exception as exc:
+                    logger.warning(f"Write-behind flush of {len(ops)} operations failed, retrying one by one : {str(exc)}")
+                    await self._flush_each(ops)
+
+    async def _flush_each(self, ops: list[tuple]):
+        """ Write each coalesced operation in its own transaction, dropping only those that fail """
+        inserts, updates = coalesce(ops)
+        single_ops = [(INSERT, model, None, values) for model, values in inserts]
+        single_ops += [(UPDATE, model, pk, values) for (model, pk), values in updates.items()]
+        for op in single_ops:
+            try:
+                async with self.session_factory() as db:
+                    await self._flush(db, [op])
+            except Exception as exc:
+                logger.exception(f"Dropping write-behind {op[0]} on {op[1].__tablename__} : {str(exc)}")
+
+    async def _flush(self, db: AsyncSession, ops: list[tuple]):
+        inserts, updates = coalesce(ops)
+
+        # Core executemany takes its column list from the first row, so every
+        # statement only gets rows that set the same columns
+        insert_groups = defaultdict(list)
+        for model, values in inserts:
+            insert_groups[(model, tuple(sorted(values)))].append(values)
+
+        # Core executemany does not check matched rowcounts, so rows deleted in
+        # the meantime are skipped rather than failing the batch
+        update_groups = defaultdict(list)
+        for (model, pk), values in updates.items():
+            update_groups[(model, tuple(sorted(values)))].append({"_pk": pk, **values})
+
+        try:
+            for (model, _columns), rows in insert_groups.items():
+                await db.execute(insert(model.__table__), rows)
+            for (model, _columns), rows in update_groups.items():
+                table = model.__table__
+                await db.execute(update(table).where(table.c.id == bindparam("_pk")), rows)
+            await db.commit()
+        except Exception as exc:
+            await db.rollback()
+            raise exc
+
+
+write_behind = WriteBehindQueue(
+    batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+    max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+    redis_url=str(settings.REDIS_URL) if settings.WRITE_BEHIND_USE_REDIS else None,
+)
@@ -0,0 +1,242 @@
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Content types that are already compressed (or not worth compressing)
+EXCLUDED_CONTENT_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/octet-stream",
+)
+
+# Compression levels per content type prefix, per encoding.
+# Event streams favour latency, JSON/text favour ratio.
+DEFAULT_LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+CONTENT_TYPE_LEVELS = {
+    "text/event-stream": {"gzip": 1, "br": 1, "zstd": 1},
+    "application/json": {"gzip": 6, "br": 5, "zstd": 6},
+    "text/csv": {"gzip": 6, "br": 5, "zstd": 6},
+    "text/": {"gzip": 6, "br": 5, "zstd": 3},
+}
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush so each streamed chunk reaches the client straight away
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encoders() -> dict:
+    """ Encoders supported by this install, in server preference order """
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = ZstdEncoder
+    if brotli is not None:
+        encoders["br"] = BrotliEncoder
+    encoders["gzip"] = GzipEncoder
+    return encoders
+
+
+def negotiate_encoding(accept_encoding: str, supported: list[str]) -> str | None:
+    """ Pick the best encoding from an Accept-Encoding header, ties broken by server preference """
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, *params = part.split(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = min(max(float(value.strip()), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        weights[token] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compression_level(content_type: str, encoding: str) -> int:
+    for prefix, levels in CONTENT_TYPE_LEVELS.items():
+        if content_type.startswith(prefix):
+            return levels[encoding]
+    return DEFAULT_LEVELS[encoding]
+
+
+def is_compressible(content_type: str) -> bool:
+    return bool(content_type) and not content_type.startswith(EXCLUDED_CONTENT_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Negotiates gzip/brotli/zstd response compression.
+
+    Bodies smaller than `minimum_size` are sent as-is. Streaming responses have
+    no known size and are compressed chunk by chunk as they are sent. Range
+    requests, partial responses and `Cache-Control: no-transform` responses
+    are never compressed.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = available_encoders()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        # Byte ranges refer to the uncompressed body
+        if "range" in request_headers:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""), list(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(self.app, encoding, self.encoders[encoding], self.minimum_size)
+        await responder(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, encoder_class: type, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.encoder_class = encoder_class
+        self.minimum_size = minimum_size
+        self.send: Send = None
+        self.start_message: Message | None = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    async def send_with_compression(self, message: Message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # Hold the start message until the first body message tells us whether the body is streamed
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_length = headers.get("content-length")
+            self.passthrough = (
+                "content-encoding" in headers
+                or "no-transform" in headers.get("cache-control", "").lower()
+                or message["status"] in (204, 206, 304)
+                or not is_compressible(headers.get("content-type", ""))
+                or (content_length is not None and int(content_length) < self.minimum_size)
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is not None:
+            if more_body:
+                chunk = self.encoder.compress(body)
+                if chunk:
+                    await self.send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                await self.send({"type": "http.response.body", "body": self.encoder.finish(body)})
+            return
+
+        if not more_body:
+            # The whole body is known; compress only if it clears the threshold
+            if len(body) < self.minimum_size:
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            compressed = self.start_encoder().finish(body)
+            self.update_headers(content_length=len(compressed))
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        # Streaming response: its final size is unknown, so compress right away
+        # rather than holding chunks (and the headers) back behind the threshold
+        self.start_encoder()
+        self.update_headers(content_length=None)
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": self.encoder.compress(body), "more_body": True})
+
+    def start_encoder(self):
+        content_type = Headers(raw=self.start_message["headers"]).get("content-type", "")
+        level = compression_level(content_type, self.encoding)
+        self.encoder = self.encoder_class(level)
+        return self.encoder
+
+    def update_headers(self, content_length: int | None):
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # The compressed representation is no longer byte-identical to the original
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
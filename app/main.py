@@ -5,6 +5,8 @@ from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 from app.core.config import settings, fastapi_config
 from app.core.auth.fake_auth import router as auth_router
+from app.core.database.write_behind import write_behind
+from app.core.middleware.compression import CompressionMiddleware
 from app.modules.users.router import router as user_router
 
 logger = logging.getLogger(__name__)
@@ -13,10 +15,12 @@ logger = logging.getLogger(__name__)
 async def lifespan(_application: FastAPI) -> AsyncGenerator:
     # Startup
     logger.info("*** Server starting UP ***")
+    await write_behind.start()
     yield
 
     # Shutdown
     logger.info("*** Server shutting DOWN ***")
+    await write_behind.stop()
 
 
 app = FastAPI(**fastapi_config, lifespan=lifespan)
@@ -30,5 +34,10 @@ app.add_middleware(
     allow_headers=settings.CORS_HEADERS,
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+)
+
 app.include_router(user_router, prefix="/user", tags=["User"])
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
@@ -0,0 +1,182 @@
+import gzip
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from app.core.middleware.compression import (
+    CompressionMiddleware,
+    CompressionResponder,
+    GzipEncoder,
+    compression_level,
+    negotiate_encoding,
+)
+
+LARGE_PAYLOAD = {"data": "a" * 5000}
+
+
+async def small(request):
+    return PlainTextResponse("hi")
+
+
+async def large(request):
+    return JSONResponse(LARGE_PAYLOAD, headers={"ETag": '"abc"'})
+
+
+async def partial(request):
+    return PlainTextResponse("a" * 5000, status_code=206)
+
+
+async def no_transform(request):
+    return PlainTextResponse("a" * 5000, headers={"Cache-Control": "public, no-transform"})
+
+
+async def stream(request):
+    async def generate():
+        for _ in range(10):
+            yield b"x" * 300
+    return StreamingResponse(generate(), media_type="text/plain")
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[
+        Route("/small", small),
+        Route("/large", large),
+        Route("/partial", partial),
+        Route("/no-transform", no_transform),
+        Route("/stream", stream),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("*", "zstd"),
+    ("", None),
+    ("gzip;q=0.5;level=1, br;Q=0.1", "gzip"),
+    ("br;q=5, gzip;q=0.9", "br"),
+    ("zstd;q=-1, gzip", "gzip"),
+    ("gzip;q=abc", None),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header, ["zstd", "br", "gzip"]) == expected
+
+
+def test_compression_level_by_content_type():
+    assert compression_level("text/event-stream", "gzip") == 1
+    assert compression_level("application/json", "br") == 5
+    assert compression_level("text/html; charset=utf-8", "zstd") == 3
+    assert compression_level("application/xml", "gzip") == 6
+
+
+def test_small_body_not_compressed(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "hi"
+
+
+def test_large_body_compressed(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert int(response.headers["content-length"]) < 5000
+    assert response.json() == LARGE_PAYLOAD
+
+
+def test_not_compressed_without_accept_encoding(client):
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+
+
+def test_range_and_partial_content_not_compressed(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-10"})
+    assert "content-encoding" not in response.headers
+    response = client.get("/partial", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_no_transform_not_compressed(client):
+    response = client.get("/no-transform", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "a" * 5000
+
+
+def test_streaming_body_compressed(client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "x" * 3000
+
+
+@pytest.mark.asyncio
+async def test_streaming_chunks_are_not_buffered():
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        await send({"type": "http.response.body", "body": b"data: hi\n\n", "more_body": True})
+        # Headers and the first event must already be downstream
+        assert [message["type"] for message in sent] == ["http.response.start", "http.response.body"]
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    responder = CompressionResponder(app, "gzip", GzipEncoder, minimum_size=1024)
+    await responder({"type": "http"}, None, send)
+
+    body = b"".join(message["body"] for message in sent[1:])
+    assert gzip.decompress(body) == b"data: hi\n\n"
+
+
+async def run_responder(encoding, encoder_class, content_type, chunks):
+    """ Send `chunks` through a responder and return the response headers and raw body """
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type.encode())]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    async def send(message):
+        sent.append(message)
+
+    responder = CompressionResponder(app, encoding, encoder_class, minimum_size=1024)
+    await responder({"type": "http"}, None, send)
+    headers = {k.decode(): v.decode() for k, v in sent[0]["headers"]}
+    return headers, b"".join(message["body"] for message in sent[1:])
+
+
+CONTENT_TYPES = ["application/json", "text/event-stream", "text/html", "application/xml"]
+BODY = b'{"data": "' + b"a" * 5000 + b'"}'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content_type", CONTENT_TYPES)
+@pytest.mark.parametrize("chunks", [[BODY], [BODY[:100], BODY[100:2000], BODY[2000:], b""]], ids=["whole", "streaming"])
+async def test_brotli_round_trip(content_type, chunks):
+    brotli = pytest.importorskip("brotli")
+    from app.core.middleware.compression import BrotliEncoder
+
+    headers, body = await run_responder("br", BrotliEncoder, content_type, chunks)
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(body) == BODY
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content_type", CONTENT_TYPES)
+@pytest.mark.parametrize("chunks", [[BODY], [BODY[:100], BODY[100:2000], BODY[2000:], b""]], ids=["whole", "streaming"])
+async def test_zstd_round_trip(content_type, chunks):
+    zstandard = pytest.importorskip("zstandard")
+    from app.core.middleware.compression import ZstdEncoder
+
+    headers, body = await run_responder("zstd", ZstdEncoder, content_type, chunks)
+    assert headers["content-encoding"] == "zstd"
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(body) == BODY
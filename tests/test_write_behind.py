@@ -0,0 +1,216 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database.base import DeclarativeBase
+from app.core.database.write_behind import (
+    INSERT,
+    UPDATE,
+    MemoryBackend,
+    WriteBehindQueue,
+    coalesce,
+    deserialize_op,
+    model_registry,
+    serialize_op,
+)
+from app.modules.users.models import User
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(DeclarativeBase.metadata.create_all)
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def all_users(session_factory):
+    async with session_factory() as db:
+        result = await db.execute(select(User).order_by(User.id))
+        return [(user.id, user.displayname) for user in result.scalars()]
+
+
+def test_coalesce_merges_updates_to_same_row():
+    inserts, updates = coalesce([
+        (UPDATE, User, 1, {"displayname": "a"}),
+        (INSERT, User, None, {"displayname": "new"}),
+        (UPDATE, User, 1, {"displayname": "b"}),
+        (UPDATE, User, 2, {"displayname": "c"}),
+    ])
+    assert inserts == [(User, {"displayname": "new"})]
+    assert updates == {(User, 1): {"displayname": "b"}, (User, 2): {"displayname": "c"}}
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_coalesces_and_batches():
+    backend = MemoryBackend()
+    assert await backend.push((UPDATE, User, 1, {"displayname": "a"}), limit=2) == 1
+    assert await backend.push((INSERT, User, None, {"displayname": "x"}), limit=2) == 2
+    # Full, but updates to an already queued row still merge
+    assert await backend.push((UPDATE, User, 1, {"updated_at": "now"}), limit=2) == 2
+    assert await backend.push((UPDATE, User, 2, {"displayname": "b"}), limit=2) is None
+
+    assert await backend.pop_batch(1) == [(INSERT, User, None, {"displayname": "x"})]
+    assert await backend.pop_batch(10) == [(UPDATE, User, 1, {"displayname": "a", "updated_at": "now"})]
+    assert await backend.pop_batch(10) == []
+
+
+def test_serialize_round_trip():
+    values = {
+        "updated_at": datetime(2024, 5, 1, 12, 30),
+        "day": date(2024, 5, 1),
+        "at": time(12, 30),
+        "amount": Decimal("12.50"),
+        "ref": UUID("12345678-1234-5678-1234-567812345678"),
+        "displayname": "a",
+        "count": 3,
+        "missing": None,
+    }
+    op = (UPDATE, User, 3, values)
+    assert deserialize_op(serialize_op(op), model_registry()) == op
+
+
+def test_serialize_rejects_unsupported_values():
+    class Color(Enum):
+        RED = "red"
+
+    with pytest.raises(TypeError, match="Enum|Color"):
+        serialize_op((UPDATE, User, 1, {"color": Color.RED}))
+
+
+@pytest.mark.asyncio
+async def test_push_before_start_is_dropped():
+    queue = WriteBehindQueue()
+    await queue.update(User, 1, displayname="a")
+    assert queue.backend is None
+
+
+@pytest.mark.asyncio
+async def test_push_dropped_when_full(session_factory):
+    queue = WriteBehindQueue(session_factory=session_factory, max_pending=2, flush_interval=60)
+    await queue.start()
+    for i in range(3):
+        await queue.insert(User, displayname=f"u{i}")
+    assert await queue.backend.size() == 2
+    await queue.stop()
+    assert await all_users(session_factory) == [(1, "u0"), (2, "u1")]
+
+
+@pytest.mark.asyncio
+async def test_flush_coalesces_and_skips_missing_rows(session_factory):
+    queue = WriteBehindQueue(session_factory=session_factory, flush_interval=60)
+    await queue.start()
+    await queue.insert(User, displayname="u1")
+    await queue.insert(User, displayname="u2")
+    await queue.drain()
+
+    await queue.update(User, 1, displayname="a")
+    await queue.update(User, 1, displayname="b")
+    await queue.update(User, 999, displayname="gone")
+    await queue.update(User, 2, displayname="c")
+    await queue.stop()
+
+    assert await all_users(session_factory) == [(1, "b"), (2, "c")]
+
+
+@pytest.mark.asyncio
+async def test_backend_error_does_not_stop_queue(session_factory):
+    queue = WriteBehindQueue(session_factory=session_factory, flush_interval=60)
+    await queue.start()
+
+    pop_batch = queue.backend.pop_batch
+    calls = 0
+
+    async def flaky_pop_batch(size):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("backend unavailable")
+        return await pop_batch(size)
+
+    queue.backend.pop_batch = flaky_pop_batch
+    await queue.insert(User, displayname="u1")
+    await queue.drain()
+    assert await all_users(session_factory) == []
+
+    await queue.stop()
+    assert await all_users(session_factory) == [(1, "u1")]
+
+
+@pytest.mark.asyncio
+async def test_inserts_with_different_columns(session_factory):
+    queue = WriteBehindQueue(session_factory=session_factory, flush_interval=60)
+    await queue.start()
+    await queue.insert(User, displayname="a")
+    await queue.insert(User, displayname="b", created_at=datetime(2020, 1, 1))
+    await queue.stop()
+
+    async with session_factory() as db:
+        result = await db.execute(select(User).order_by(User.id))
+        users = {user.displayname: user.created_at for user in result.scalars()}
+    assert users["b"] == datetime(2020, 1, 1)
+    assert users["a"] != datetime(2020, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_failing_operation_does_not_drop_batch(session_factory):
+    queue = WriteBehindQueue(session_factory=session_factory, flush_interval=60)
+    await queue.start()
+    await queue.insert(User, id=1, displayname="u1")
+    await queue.drain()
+
+    await queue.insert(User, id=1, displayname="duplicate")
+    await queue.insert(User, displayname="u2")
+    await queue.update(User, 1, displayname="renamed")
+    await queue.stop()
+
+    assert await all_users(session_factory) == [(1, "renamed"), (2, "u2")]
+
+
+@pytest_asyncio.fixture
+async def redis_queue(session_factory, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.core.database import write_behind
+
+    monkeypatch.setattr(write_behind.aioredis, "from_url", lambda url: fakeredis.FakeAsyncRedis())
+    queue = WriteBehindQueue(session_factory=session_factory, flush_interval=60, max_pending=3, redis_url="redis://fake")
+    await queue.start()
+    yield queue
+    if queue.backend is not None:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_queues_and_flushes(redis_queue, session_factory):
+    await redis_queue.insert(User, displayname="u1", created_at=datetime(2020, 1, 1))
+    await redis_queue.update(User, 1, displayname="a")
+    await redis_queue.update(User, 1, displayname="b")
+    assert await redis_queue.backend.size() == 3
+
+    # Full: the fourth job is trimmed away
+    await redis_queue.update(User, 1, displayname="c")
+    assert await redis_queue.backend.size() == 3
+
+    await redis_queue.stop()
+    assert await all_users(session_factory) == [(1, "b")]
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_rejects_unsupported_values(redis_queue):
+    with pytest.raises(TypeError):
+        await redis_queue.update(User, 1, displayname=object())
+    assert await redis_queue.backend.size() == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_drops_malformed_jobs(redis_queue):
+    backend = redis_queue.backend
+    await backend.redis.rpush(backend.key, "not json", '{"kind": "update", "table": "nope", "pk": 1, "values": {}}')
+    await redis_queue.update(User, 1, displayname="a")
+    assert await backend.pop_batch(10) == [(UPDATE, User, 1, {"displayname": "a"})]